@@ -1,18 +1,30 @@
+import inspect
+
+import numpy as np
 import pandas as pd
 
 
-def index_construct(df, date, cutoff, capital):
+# Rebalancing actions, in block order; stored as int8 codes in the combined output
+ACTION_DTYPE = pd.CategoricalDtype(categories=["ADJUST", "SELL", "BUY", "IGNORE"], ordered=False)
+
+
+def index_construct(df, date, cutoff, capital, _date_groups=None):
     """
     Parameters
     ----------
     df : pd.DataFrame
-        Must include columns ["date", "company", "market_cap_m", "price"]
+        Must include columns ["date", "company", "market_cap_m", "price"];
+        "date" is expected as datetime64 (see utils.load_data)
     date : str or datetime
         Date to filter the data for
     cutoff : float
         Cumulative market-cap percentile threshold (0-1)
     capital : float
         Total capital to allocate
+    _date_groups : dict, optional
+        Precomputed ``df.groupby(df["date"].dt.normalize()).indices`` mapping
+        each calendar day to its row positions; avoids rescanning the date
+        column on every call
 
     Returns
     -------
@@ -51,37 +63,72 @@ def index_construct(df, date, cutoff, capital):
     if capital <= 0:
         raise ValueError(f"Capital must be positive. Got: {capital}")
     
-    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
-    if date not in df["date"].values:
-        raise ValueError(f"Date {date} not found in DataFrame.")
-    
+    # Dates are normally parsed once in load_data; only fall back for raw frames
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df = df.assign(date=pd.to_datetime(df["date"]).dt.normalize())
+
+    # Dates are matched by calendar day, ignoring any intraday time
+    day = pd.Timestamp(date).normalize()
+
+    # Filter by date (row positions only; the frame is gathered once below)
+    if _date_groups is not None:
+        rows = _date_groups.get(day)
+        if rows is None:
+            raise ValueError(f"Date {date} not found in DataFrame.")
+    else:
+        rows = np.flatnonzero(df["date"].dt.normalize() == day)
+        if rows.size == 0:
+            raise ValueError(f"Date {date} not found in DataFrame.")
 
-   # Filter by date
-    subset = df[df["date"] == date].copy()
+    # Compute the total market cap of all stocks
+    # (rows without a market cap are dropped, as pandas' NaN-skipping sum did;
+    # they fall in neither universe)
+    mc = df["market_cap_m"].to_numpy(dtype=np.float64)[rows]
+    has_mc = ~np.isnan(mc)
+    if not has_mc.all():
+        rows, mc = rows[has_mc], mc[has_mc]
+    total_mc = mc.sum()
 
     # Order companies by descending market cap
-    subset = subset.sort_values(by="market_cap_m", ascending=False)
-
-    # Compute the total market cap of all stocks
-    total_mc = subset["market_cap_m"].sum()
+    order = np.argsort(-mc, kind="stable")
+    ranked = df.iloc[rows[order]]
 
     # Calculate each company’s market cap weight and cumulative weight
-    subset["weight"] = subset["market_cap_m"] / total_mc
-    subset["cumulative"] = subset["weight"].cumsum()
+    weight = mc[order] / total_mc
+    cumulative = np.cumsum(weight)
 
-    # Select companies up to the 85th cumulative percentile (by market cap weight)
-    universe_in = subset.loc[subset["cumulative"] <= cutoff].copy()
-    # Companies that do NOT make the cutoff
-    universe_out = subset.loc[subset["cumulative"] > cutoff].copy()
+    # Cumulative weight is monotone, so the cutoff is a single split position
+    k = int(np.searchsorted(cumulative, cutoff, side="right"))
 
     # Allocate $100 million to the selected stocks, and calculate the number of shares to buy for each
-    universe_in["allocation"] = capital * universe_in["weight"]
-    universe_in["shares"] = universe_in["allocation"] / universe_in["price"]
+    # (computed on the sorted arrays, so no intermediate Series are built)
+    allocation = capital * weight[:k]
+    shares = allocation / ranked["price"].to_numpy(dtype=np.float64)[:k]
+
+    # Select companies up to the 85th cumulative percentile (by market cap weight)
+    # assign() returns a new frame, so the slices need no defensive copy
+    universe_in = ranked.iloc[:k].assign(
+        weight=weight[:k], cumulative=cumulative[:k], allocation=allocation, shares=shares
+    )
+    # Companies that do NOT make the cutoff
+    universe_out = ranked.iloc[k:].assign(weight=weight[k:], cumulative=cumulative[k:])
 
     return total_mc, universe_in, universe_out
 
 
-def rebalancing(df, old_date, new_date, index_construct, **kwargs):
+def _accepts_date_groups(func):
+    """True if `func` can take the `_date_groups` keyword (explicitly or via **kwargs)."""
+    try:
+        params = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return any(
+        p.name == "_date_groups" or p.kind is inspect.Parameter.VAR_KEYWORD
+        for p in params
+    )
+
+
+def rebalancing(df, old_date, new_date, index_construct, _cache=None, **kwargs):
     """
     Rebalance a portfolio between two dates based on index construction.
 
@@ -105,81 +152,131 @@ def rebalancing(df, old_date, new_date, index_construct, **kwargs):
         - "SELL" → stock removed from portfolio 
         - "IGNORE" → stock not in portfolio on either date (both universe)
 
+    Caching:
+
+    - _cache: optional dict shared across calls (e.g. a sequential backtest) so
+      the index for each date is built once, even though day t's new date is
+      day t+1's old date. Entries are keyed on the date and the index_construct
+      kwargs; reuse a cache only with the same df and index_construct.
+
     """
 
+    # Cache keys are only built when a cache is supplied; unhashable kwargs
+    # (e.g. lists for a custom index_construct) simply disable caching
+    old_key = new_key = None
+    if _cache is not None:
+        index_kwargs = sorted((k, v) for k, v in kwargs.items() if k != "_date_groups")
+        try:
+            old_key, new_key = (old_date, *index_kwargs), (new_date, *index_kwargs)
+            hash((old_key, new_key))
+        except TypeError:
+            old_key = new_key = None
+    cached = old_key is not None and old_key in _cache and new_key in _cache
+
+    # Group row positions by calendar day once so both index_construct calls are lookups
+    # (only for callables that accept the keyword; custom ones keep their signature)
+    if not cached and _accepts_date_groups(index_construct):
+        if "date" in df.columns and pd.api.types.is_datetime64_any_dtype(df["date"]):
+            kwargs.setdefault("_date_groups", df.groupby(df["date"].dt.normalize(), sort=False).indices)
+
+    def construct(date, key):
+        if key is not None and key in _cache:
+            return _cache[key]
+        result = index_construct(df, date, **kwargs)
+        if key is not None:
+            _cache[key] = result
+        return result
 
     # Index calculation for old date
-    total_mc_old, universe_in_old, universe_out_old = index_construct(df, old_date, **kwargs)
+    total_mc_old, universe_in_old, universe_out_old = construct(old_date, old_key)
 
     # Index calculation for new date
-    total_mc_new, universe_in_new, universe_out_new = index_construct(df, new_date, **kwargs)
+    total_mc_new, universe_in_new, universe_out_new = construct(new_date, new_key)
 
 
-    # Identify stock sets
-    old_in_set = set(universe_in_old["company"])
-    old_out_set = set(universe_out_old["company"])
-    new_in_set = set(universe_in_new["company"])
-    new_out_set = set(universe_out_new["company"])
+    # Identify stock sets (hash-based pandas Index rather than Python sets)
+    old_in_set = pd.Index(universe_in_old["company"])
+    old_out_set = pd.Index(universe_out_old["company"])
+    new_in_set = pd.Index(universe_in_new["company"])
+    new_out_set = pd.Index(universe_out_new["company"])
 
     # Determine actions using Inner Join
-    hold_set = old_in_set & new_in_set       # Keep stocks
-    sell_set = old_in_set & new_out_set      # Sell stocks
-    buy_set = old_out_set & new_in_set       # Buy stocks
-    ignore_set = old_out_set & new_out_set   # Ignore stocks
-
-    # Prepare combined dataframe
-    combined = pd.DataFrame()
+    hold_set = old_in_set.intersection(new_in_set)       # Keep stocks
+    sell_set = old_in_set.intersection(new_out_set)      # Sell stocks
+    buy_set = old_out_set.intersection(new_in_set)       # Buy stocks
+    ignore_set = old_out_set.intersection(new_out_set)   # Ignore stocks
 
     # These stocks will remain in the universe. 
     # ADJUST label is being used -
     # because even if a stock stays in the universe, its weight has changed and may need to buy or sell some shares 
-    hold_df = universe_in_new[universe_in_new["company"].isin(hold_set)].copy()
-    hold_df["shares_old"] = universe_in_old.set_index("company").loc[hold_df["company"], "shares"].values
-    hold_df["allocation_old"] = universe_in_old.set_index("company").loc[hold_df["company"], "allocation"].values
-    hold_df["trade_shares"] = hold_df["shares"] - hold_df["shares_old"]
-    hold_df["trade_value"] = hold_df["trade_shares"] * hold_df["price"]
-    hold_df["action"] = ["ADJUST"] * len(hold_df)
-    combined = pd.concat([combined, hold_df], ignore_index=True)
+    # Single hash-join on company brings in both old-date columns in one pass
+    old_holdings = universe_in_old[["company", "shares", "allocation"]].rename(
+        columns={"shares": "shares_old", "allocation": "allocation_old"}
+    )
+    hold_df = universe_in_new[universe_in_new["company"].isin(hold_set)].merge(
+        old_holdings, on="company", how="left"
+    )
+    trade_shares = hold_df["shares"].to_numpy() - hold_df["shares_old"].to_numpy()
+    hold_df["trade_shares"] = trade_shares
+    hold_df["trade_value"] = trade_shares * hold_df["price"].to_numpy()
 
 
     # SELL
-    sell_df = universe_in_old[universe_in_old["company"].isin(sell_set)].copy()
-    sell_df["shares_old"] = sell_df["shares"]
-    sell_df["allocation_old"] = sell_df["allocation"]
-    sell_df["shares"] = 0
-    sell_df["allocation"] = 0
-    sell_df["trade_shares"] = -sell_df["shares_old"]
-    sell_df["trade_value"] = sell_df["trade_shares"] * sell_df["price"]
-    sell_df["action"] = ["SELL"] * len(sell_df)
-    combined = pd.concat([combined, sell_df], ignore_index=True)
+    sell_rows = universe_in_old[universe_in_old["company"].isin(sell_set)]
+    trade_shares = -sell_rows["shares"].to_numpy()
+    sell_df = sell_rows.assign(
+        shares_old=sell_rows["shares"].to_numpy(),
+        allocation_old=sell_rows["allocation"].to_numpy(),
+        shares=0,
+        allocation=0,
+        trade_shares=trade_shares,
+        trade_value=trade_shares * sell_rows["price"].to_numpy(),
+    )
 
     # BUY
-    buy_df = universe_in_new[universe_in_new["company"].isin(buy_set)].copy()
-    buy_df["shares_old"] = 0
-    buy_df["allocation_old"] = 0
-    buy_df["trade_shares"] = buy_df["shares"]
-    buy_df["trade_value"] = buy_df["trade_shares"] * buy_df["price"]
-    buy_df["action"] = ["BUY"] * len(buy_df)
-    combined = pd.concat([combined, buy_df], ignore_index=True)
+    buy_rows = universe_in_new[universe_in_new["company"].isin(buy_set)]
+    trade_shares = buy_rows["shares"].to_numpy()
+    buy_df = buy_rows.assign(
+        shares_old=0,
+        allocation_old=0,
+        trade_shares=trade_shares,
+        trade_value=trade_shares * buy_rows["price"].to_numpy(),
+    )
 
     # IGNORE (optional, usually not included)
-    ignore_df = universe_out_new[universe_out_new["company"].isin(ignore_set)].copy()
-    ignore_df["shares_old"] = 0
-    ignore_df["allocation_old"] = 0
-    ignore_df["shares"] = 0
-    ignore_df["allocation"] = 0
-    ignore_df["trade_shares"] = 0
-    ignore_df["trade_value"] = 0
-    ignore_df["action"] = ["IGNORE"] * len(ignore_df)
-    combined = pd.concat([combined, ignore_df], ignore_index=True)
-
-    # Reorder columns for clarity
+    # Built in one constructor call; every position/trade column is zero
+    ignore_rows = universe_out_new.loc[universe_out_new["company"].isin(ignore_set), ["company", "price"]]
+    zeros = np.zeros(len(ignore_rows))
+    ignore_df = pd.DataFrame({
+        "company": ignore_rows["company"].array,
+        "price": ignore_rows["price"].to_numpy(),
+        "shares_old": zeros,
+        "allocation_old": zeros,
+        "shares": zeros,
+        "allocation": zeros,
+        "trade_shares": zeros,
+        "trade_value": zeros,
+    })
+
+    # Assemble once and reorder columns for clarity
+    combined = pd.concat([hold_df, sell_df, buy_df, ignore_df], ignore_index=True)
     combined = combined[[
         "company", "shares_old", "allocation_old",
         "shares", "allocation",
-        "price", "trade_shares", "trade_value", "action"
+        "price", "trade_shares", "trade_value"
     ]]
 
+    # Label each block's rows by position; stored as a 4-value categorical
+    combined["action"] = pd.Categorical.from_codes(
+        np.r_[
+            np.zeros(len(hold_df), dtype=np.int8),
+            np.ones(len(sell_df), dtype=np.int8),
+            np.full(len(buy_df), 2, dtype=np.int8),
+            np.full(len(ignore_df), 3, dtype=np.int8),
+        ],
+        dtype=ACTION_DTYPE,
+    )
+
     return combined
 
 
@@ -219,33 +316,43 @@ def portfolio_summary(combined, round_digits):
     """
     
     # Filter out ignored stocks
-    portfolio_stocks = combined[combined["action"] != "IGNORE"].copy()
+    portfolio_stocks = combined[combined["action"] != "IGNORE"]
+
+    # Pull each column out once; all reductions below run on these arrays
+    shares_old = portfolio_stocks["shares_old"].to_numpy()
+    shares_new = portfolio_stocks["shares"].to_numpy()
+    price = portfolio_stocks["price"].to_numpy()
+    trade_shares = portfolio_stocks["trade_shares"].to_numpy()
+    trade_value = portfolio_stocks["trade_value"].to_numpy()
 
-    # Old and new portfolio values
-    old_value = float((portfolio_stocks["shares_old"] * portfolio_stocks["price"]).sum())
-    new_value = float((portfolio_stocks["shares"] * portfolio_stocks["price"]).sum())
+    # Old and new portfolio values (nansum skips missing values like pandas' sum)
+    old_value = float(np.nansum(shares_old * price))
+    new_value = float(np.nansum(shares_new * price))
 
     # Trading stats
-    total_trade_value = float(portfolio_stocks["trade_value"].abs().sum())
-    buys = float(portfolio_stocks[portfolio_stocks["action"] == "BUY"]["trade_value"].sum())
-    sells = float(portfolio_stocks[portfolio_stocks["action"] == "SELL"]["trade_value"].sum())
-    adjusts = float(portfolio_stocks[portfolio_stocks["action"] == "ADJUST"]["trade_value"].sum())
+    total_trade_value = float(np.nansum(np.abs(trade_value)))
+    # One grouped pass yields every per-action total
+    by_action_groups = portfolio_stocks.groupby("action", observed=True)
+    by_action = by_action_groups["trade_value"].sum()
+    buys = float(by_action.get("BUY", 0))
+    sells = float(by_action.get("SELL", 0))
+    adjusts = float(by_action.get("ADJUST", 0))
 
     dollar_turnover_pct = total_trade_value / new_value if new_value > 0 else 0
 
     # Share-based turnover (industry standard)
-    portfolio_stocks["avg_shares"] = (portfolio_stocks["shares_old"] + portfolio_stocks["shares"]) / 2
-    total_avg_shares = portfolio_stocks["avg_shares"].sum()
-    share_turnover_pct = portfolio_stocks["trade_shares"].abs().sum() / total_avg_shares * 100
+    total_avg_shares = 0.5 * np.nansum(shares_old + shares_new)
+    share_turnover_pct = np.nansum(np.abs(trade_shares)) / total_avg_shares * 100
 
 
     # New equities purchased
-    new_buys = portfolio_stocks[portfolio_stocks["action"] == "BUY"].copy()
+    empty = portfolio_stocks.iloc[0:0]
+    new_buys = by_action_groups.get_group("BUY") if "BUY" in by_action.index else empty
     total_new_shares = new_buys["trade_shares"].sum()
     new_buys_list = new_buys[["company", "shares", "trade_shares", "trade_value"]]
 
     # Equities sold
-    sold_stocks = portfolio_stocks[portfolio_stocks["action"] == "SELL"].copy()
+    sold_stocks = by_action_groups.get_group("SELL") if "SELL" in by_action.index else empty
     total_sold_shares = sold_stocks["shares_old"].sum()
     sold_list = sold_stocks[["company", "shares_old", "trade_shares", "trade_value"]]
 
@@ -261,8 +368,8 @@ def portfolio_summary(combined, round_digits):
         "share_turnover_pct": f"{share_turnover_pct:.2f}%",
         "total_new_shares": int(total_new_shares),
         "total_sold_shares": int(total_sold_shares),
-        "new_buys": new_buys_list.reset_index(drop=True),
-        "sold_stocks": sold_list.reset_index(drop=True)
+        "new_buys": new_buys_list.set_axis(pd.RangeIndex(len(new_buys_list)), axis=0),
+        "sold_stocks": sold_list.set_axis(pd.RangeIndex(len(sold_list)), axis=0)
     }
 
     return summary
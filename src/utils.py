@@ -1,15 +1,19 @@
 import pandas as pd
-import json
+import orjson
 from pathlib import Path
 
 
 
 def load_data(csv_name: str) -> pd.DataFrame:
-    df = pd.read_csv(csv_name)
+    # PyArrow parses in C++ and infers numeric types in the same pass, so the
+    # to_numeric coercions below are no-ops unless a column contains bad values
+    df = pd.read_csv(csv_name, engine="pyarrow", dtype={"company": "category"})
+    # Normalise dates once here so index_construct can compare datetime64 directly
+    df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.normalize()
+    # Store numerics as float64 so index_construct's to_numpy calls are zero-copy views
+    df["market_cap_m"] = pd.to_numeric(df["market_cap_m"], errors="coerce").astype("float64")
+    df["price"] = pd.to_numeric(df["price"], errors="coerce").astype("float64")
     df = df.dropna(subset=["date", "market_cap_m", "price"])
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df["market_cap_m"] = pd.to_numeric(df["market_cap_m"], errors="coerce")
-    df["price"] = pd.to_numeric(df["price"], errors="coerce")
     return df
 
 
@@ -43,7 +47,9 @@ def save_summary_json(summary, file_path):
         else:
             serializable_summary[k] = v
 
-    with open(file_path, "w") as f:
-        json.dump(serializable_summary, f, indent=4)
+    # orjson serialises in Rust and handles numpy scalars/arrays natively
+    file_path.write_bytes(
+        orjson.dumps(serializable_summary, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    )
 
     print(f"Summary saved as JSON to {file_path}")
\ No newline at end of file
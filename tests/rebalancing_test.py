@@ -1,5 +1,5 @@
 import pandas as pd
-from src.core import rebalancing
+from src.core import ACTION_DTYPE, index_construct, rebalancing, portfolio_summary
 
 def mock_index_construct(df, date, **kwargs):
     """
@@ -44,6 +44,7 @@ def test_rebalancing():
     assert result.loc[result["company"] == "A", "action"].item() == "ADJUST"
     assert result.loc[result["company"] == "B", "action"].item() == "SELL"
     assert result.loc[result["company"] == "C", "action"].item() == "BUY"
+    assert result["action"].dtype == ACTION_DTYPE
 
     # Check A adjustments
     row_a = result[result["company"] == "A"].iloc[0]
@@ -65,3 +66,163 @@ def test_rebalancing():
     assert row_c["shares"] == 200
     assert row_c["trade_shares"] == 200
     assert row_c["trade_value"] == 8_000 # Buying new holdings
+
+
+def test_portfolio_summary():
+    combined = rebalancing(pd.DataFrame(), "old", "new", mock_index_construct)
+
+    summary = portfolio_summary(combined, 2)
+
+    assert summary["old_portfolio_value"] == 19_000
+    assert summary["new_portfolio_value"] == 19_000
+    assert summary["total_trade_value"] == 18_000
+    assert summary["buy_value"] == 8_000
+    assert summary["sell_value"] == -9_000
+    assert summary["adjust_value"] == 1_000
+    assert summary["share_turnover_pct"] == "70.97%"
+    assert summary["total_new_shares"] == 200
+    assert summary["total_sold_shares"] == 300
+    assert list(summary["new_buys"]["company"]) == ["C"]
+    assert list(summary["sold_stocks"]["company"]) == ["B"]
+
+
+def test_index_construct_matches_intraday_dates():
+    df = pd.DataFrame({
+        "date": ["2025-08-04 16:00", "2025-08-04 16:00", "2025-08-05 16:00"],
+        "company": ["A", "B", "A"],
+        "market_cap_m": [600, 400, 500],
+        "price": [10, 20, 10],
+    })
+
+    # Dates are matched by calendar day, for raw strings and datetime64 alike
+    for frame in (df, df.assign(date=pd.to_datetime(df["date"]))):
+        total_mc, universe_in, universe_out = index_construct(frame, "2025-08-04", cutoff=0.85, capital=1_000)
+        assert total_mc == 1_000
+        assert list(universe_in["company"]) == ["A"]
+        assert list(universe_out["company"]) == ["B"]
+
+
+def test_rebalancing_fixed_signature_index_construct():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2025-08-04"] * 3 + ["2025-08-05"] * 3),
+        "company": ["A", "B", "C", "A", "B", "C"],
+        "market_cap_m": [600, 300, 100, 300, 600, 100],
+        "price": [10, 20, 5, 10, 20, 5],
+    })
+
+    # A custom index_construct without **kwargs must not receive private keywords
+    def fixed_index_construct(df, date, cutoff, capital):
+        return index_construct(df, date, cutoff, capital)
+
+    result = rebalancing(df, "2025-08-04", "2025-08-05", fixed_index_construct, cutoff=0.85, capital=1_000)
+
+    assert result.loc[result["company"] == "A", "action"].item() == "SELL"
+    assert result.loc[result["company"] == "B", "action"].item() == "BUY"
+
+
+def test_rebalancing_intraday_dates():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2025-08-04 16:00"] * 2 + ["2025-08-05 16:00"] * 2),
+        "company": ["A", "B", "A", "B"],
+        "market_cap_m": [600, 400, 400, 600],
+        "price": [10, 20, 10, 20],
+    })
+
+    # The precomputed date groups are keyed by calendar day, not raw timestamp
+    result = rebalancing(df, "2025-08-04", "2025-08-05", index_construct, cutoff=0.65, capital=1_000)
+
+    assert result.loc[result["company"] == "A", "action"].item() == "SELL"
+    assert result.loc[result["company"] == "B", "action"].item() == "BUY"
+
+
+def test_index_construct():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2025-08-04"] * 3 + ["2025-08-05"]),
+        "company": ["C", "A", "B", "A"],
+        "market_cap_m": [100, 600, 300, 500],
+        "price": [5, 10, 20, 10],
+    })
+
+    total_mc, universe_in, universe_out = index_construct(df, "2025-08-04", cutoff=0.85, capital=1_000)
+
+    assert total_mc == 1_000
+    assert list(universe_in["company"]) == ["A"]
+    assert list(universe_out["company"]) == ["B", "C"]
+    assert universe_out["cumulative"].round(6).tolist() == [0.9, 1.0]
+
+    row_a = universe_in.iloc[0]
+    assert row_a["weight"] == 0.6
+    assert row_a["allocation"] == 600
+    assert row_a["shares"] == 60
+
+
+def test_index_construct_skips_missing_market_cap():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2025-08-04"] * 4),
+        "company": ["A", "B", "C", "D"],
+        "market_cap_m": [600, 300, 100, float("nan")],
+        "price": [10, 20, 5, 8],
+    })
+
+    total_mc, universe_in, universe_out = index_construct(df, "2025-08-04", cutoff=0.85, capital=1_000)
+
+    # D has no market cap: it is excluded from the total and from both universes
+    assert total_mc == 1_000
+    assert list(universe_in["company"]) == ["A"]
+    assert list(universe_out["company"]) == ["B", "C"]
+
+
+def test_rebalancing_cache():
+    calls = []
+
+    def counting_index_construct(df, date, **kwargs):
+        calls.append(date)
+        if date == "newer":
+            universe_in = pd.DataFrame([
+                {"company": "B", "shares": 250, "allocation": 7_500_000, "price": 30},
+                {"company": "C", "shares": 300, "allocation": 12_000_000, "price": 40},
+            ])
+            universe_out = pd.DataFrame([
+                {"company": "A", "shares": 0, "allocation": 0, "price": 20},
+            ])
+            return (19_500_000, universe_in, universe_out)
+        return mock_index_construct(df, date, **kwargs)
+
+    # Sequential backtest: day t's new date is day t+1's old date
+    cache = {}
+    rebalancing(pd.DataFrame(), "old", "new", counting_index_construct, _cache=cache)
+    result = rebalancing(pd.DataFrame(), "new", "newer", counting_index_construct, _cache=cache)
+
+    # "new" is constructed once and reused as the old date of the second step
+    assert calls == ["old", "new", "newer"]
+    assert result.loc[result["company"] == "A", "action"].item() == "SELL"
+    assert result.loc[result["company"] == "A", "shares_old"].item() == 550
+    assert result.loc[result["company"] == "B", "action"].item() == "BUY"
+    assert result.loc[result["company"] == "C", "action"].item() == "ADJUST"
+    assert result.loc[result["company"] == "C", "trade_shares"].item() == 100
+
+
+def test_rebalancing_unhashable_kwargs():
+    # Unhashable kwargs for a custom index_construct are forwarded untouched,
+    # with or without a cache (the cache is bypassed for them)
+    def excluding_index_construct(df, date, exclude):
+        return mock_index_construct(df, date)
+
+    cache = {}
+    for maybe_cache in (None, cache):
+        result = rebalancing(pd.DataFrame(), "old", "new", excluding_index_construct, _cache=maybe_cache, exclude=["A"])
+        assert set(result["company"]) == {"A", "B", "C"}
+    assert cache == {}
+
+
+def test_portfolio_summary_skips_missing_values():
+    combined = rebalancing(pd.DataFrame(), "old", "new", mock_index_construct)
+    combined["price"] = combined["price"].astype(float)
+    combined.loc[combined["company"] == "B", "price"] = float("nan")
+
+    summary = portfolio_summary(combined, 2)
+
+    # B's value is unknown, so it drops out of the dollar totals only
+    assert summary["old_portfolio_value"] == 10_000
+    assert summary["new_portfolio_value"] == 19_000
+    assert summary["share_turnover_pct"] == "70.97%"